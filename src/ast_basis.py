@@ -1,26 +1,59 @@
 # This file is used as a basis for the file generated by ast_classgen.py
 from __future__ import annotations
-from dataclasses import dataclass
 
 """
 https://docs.python.org/3/library/ast.html
 """
 
-@dataclass  
 class AST:
+    __slots__ = ("symref", "lineno", "col_offset", "end_lineno", "end_col_offset")
     _fields: tuple[str, ...] = ()
     _attribs: tuple[str, ...] = ()
-    symref: any = None # A reference to a symbol in a symbol table
-    lineno: int | None = None
-    col_offset: int | None = None
-    end_lineno: int | None = None
-    end_col_offset: int | None = None
+    _all_names: tuple[str, ...] = () # _attribs + _fields
+    _child_fields: tuple[tuple[str, bool], ...] = () # (name, is_list) for each attribute or field holding child nodes
+    
+    def __init__(self, symref: any = None, lineno: int | None = None, col_offset: int | None = None, end_lineno: int | None = None, end_col_offset: int | None = None):
+        self.symref = symref # A reference to a symbol in a symbol table
+        self.lineno = lineno
+        self.col_offset = col_offset
+        self.end_lineno = end_lineno
+        self.end_col_offset = end_col_offset
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _ast_types.add(cls)
+
+# Every AST class, so node checks are a set lookup on the exact type instead of an isinstance MRO walk
+_ast_types: set[type] = {AST}
+
+# Stands in for fields removed by NodeTransformer, since None is a valid field value
+_missing = object()
+
+_init_cache: dict[tuple, any] = {}
+
+def _make_init(fields: tuple[str, ...], attribs: tuple[str, ...] = ()):
+    """
+    Build an `__init__` taking `attribs` then `fields` as positional parameters.
+    
+    Location data is reset to None and everything else is assigned directly, so no parent `__init__` is ever called.
+    Identical signatures share the same function.
+    """
+    key = (fields, attribs)
+    if (init := _init_cache.get(key)) is not None: return init
+    
+    body = [" = ".join(f"self.{x}" for x in AST.__slots__) + " = None"]
+    body += [f"self.{x} = {x}" for x in attribs + fields]
+    
+    namespace = {}
+    exec(f"def __init__({', '.join(('self',) + attribs + fields)}):\n\t" + "\n\t".join(body), namespace)
+    init = _init_cache[key] = namespace["__init__"]
+    return init
 
 def get_source_segment(source: str, node: 'AST', padded: bool = False) -> str | None:
     """
     Get the source segment corresponding to this node.
     
-    Returns None if location data is missing.
+    Returns None if location data is missing or lies outside of `source`.
     
     https://docs.python.org/3/library/ast.html#ast.get_source_segment
     """
@@ -30,20 +63,9 @@ def get_source_segment(source: str, node: 'AST', padded: bool = False) -> str |
     if padded:
         col_offset = 0
     
-    lines = []
-    cur_line = ""
-    for c in source:
-        if len(lines) == end_lineno: break
-        if c == "\n":
-            lines.append(cur_line)
-            cur_line = ""
-            continue
-        cur_line += c
-    if cur_line != "": lines.append(cur_line)
-    del c, cur_line
-    
-    for _ in range(lineno-1): lines.pop(0)
-    lines[end_lineno-lineno] = lines[end_lineno-lineno][:end_col_offset+1]
+    lines = source.split("\n", end_lineno)[lineno-1:end_lineno]
+    if len(lines) != end_lineno-lineno+1: return None
+    lines[-1] = lines[-1][:end_col_offset+1]
     lines[0] = lines[0][col_offset:]
     return "\n".join(lines)
 
@@ -61,22 +83,24 @@ def fix_missing_locations(node: 'AST') -> 'AST':
     """
     https://docs.python.org/3/library/ast.html#ast.fix_missing_locations
     """
-    def _fix(node: 'AST', lineno, col_offset, end_lineno, end_col_offset):
-        if node.lineno == None: node.lineno = lineno
-        else: lineno = node.lineno
+    todo = [(node, 1, 0, 1, 0)]
+    while todo:
+        child, lineno, col_offset, end_lineno, end_col_offset = todo.pop()
         
-        if node.col_offset == None: node.col_offset = col_offset
-        else: col_offset = node.col_offset
+        if child.lineno is None: child.lineno = lineno
+        else: lineno = child.lineno
         
-        if node.end_lineno == None: node.end_lineno = end_lineno
-        else: end_lineno = node.end_lineno
+        if child.col_offset is None: child.col_offset = col_offset
+        else: col_offset = child.col_offset
         
-        if node.end_col_offset == None: node.end_col_offset = end_col_offset
-        else: end_col_offset = node.end_col_offset
+        if child.end_lineno is None: child.end_lineno = end_lineno
+        else: end_lineno = child.end_lineno
         
-        for child in iter_child_nodes(node):
-            _fix(child, lineno, col_offset, end_lineno, end_col_offset)
-    _fix(node, 1, 0, 1, 0)
+        if child.end_col_offset is None: child.end_col_offset = end_col_offset
+        else: end_col_offset = child.end_col_offset
+        
+        for grandchild in iter_child_nodes(child):
+            todo.append((grandchild, lineno, col_offset, end_lineno, end_col_offset))
     return node
 
 def increment_lineno(node: 'AST', n=1) -> 'AST':
@@ -85,9 +109,12 @@ def increment_lineno(node: 'AST', n=1) -> 'AST':
     
     https://docs.python.org/3/library/ast.html#ast.increment_lineno
     """
-    for child in walk(node):
-        if child.lineno != None: child.lineno += n
-        if child.end_lineno != None: child.end_lineno += n
+    todo = [node]
+    while todo:
+        child = todo.pop()
+        if child.lineno is not None: child.lineno += n
+        if child.end_lineno is not None: child.end_lineno += n
+        todo.extend(iter_child_nodes(child))
     return node
 
 def iter_fields(node: 'AST') -> tuple[str, any]:
@@ -97,52 +124,48 @@ def iter_fields(node: 'AST') -> tuple[str, any]:
     https://docs.python.org/3/library/ast.html#ast.iter_fields
     """
     for field in node._fields:
-        try:
-            yield field, getattr(node, field)
-        except AttributeError:
-            pass
+        value = getattr(node, field, _missing)
+        if value is not _missing:
+            yield field, value
 
 def iter_attribs(node: 'AST') -> tuple[str, any]:
     """
     Yield a tuple `(name, value)` for each attribute of the specified node.
     """
     for attrib in node._attribs:
-        try:
-            yield attrib, getattr(node, attrib)
-        except AttributeError:
-            pass
+        value = getattr(node, attrib, _missing)
+        if value is not _missing:
+            yield attrib, value
 
 def iter_child_nodes(node: 'AST') -> 'AST':
     """
     Yield all direct child nodes of node.
     
+    Unlike the ast package, only the attributes and fields listed in the node class's `_child_fields`
+    are looked at and their values are not type checked: anything they hold other than None is assumed
+    to be a node or a list of nodes. A list is also accepted in a single node field, since NodeTransformer
+    visitors may return one.
+    
     https://docs.python.org/3/library/ast.html#ast.iter_child_nodes
     """
-    for _, attrib in iter_attribs(node):
-        if isinstance(attrib, AST):
-            yield attrib
-        elif isinstance(attrib, list):
-            for item in attrib:
-                if isinstance(item, AST):
-                    yield item
-    for _, field in iter_fields(node):
-        if isinstance(field, AST):
-            yield field
-        elif isinstance(field, list):
-            for item in field:
-                if isinstance(item, AST):
-                    yield item
+    for name, is_list in node._child_fields:
+        value = getattr(node, name, None)
+        if value is None:
+            continue
+        if is_list or type(value) is list:
+            yield from value
+        else:
+            yield value
 
 def walk(node) -> 'AST':
     """
-    Recursively yield all descendants in BFS. The order of child nodes is unspecified.
+    Recursively yield all descendants. The order of child nodes is unspecified.
     
     https://docs.python.org/3/library/ast.html#ast.walk
     """
-    from collections import deque
-    todo = deque([node])
+    todo = [node]
     while todo:
-        node = todo.popleft()
+        node = todo.pop()
         todo.extend(iter_child_nodes(node))
         yield node
 
@@ -154,8 +177,14 @@ class NodeVisitor:
     """
     def visit(self, node) -> 'AST':
         """Visit a node"""
-        method = "visit_" + node.__class__.__name__
-        visitor = getattr(self, method, self.generic_visit)
+        # Bound visitor methods are looked up once per node class and kept on the instance
+        try:
+            visitors = self._visitors
+        except AttributeError:
+            visitors = self._visitors = {}
+        visitor = visitors.get(type(node))
+        if visitor is None:
+            visitor = visitors[type(node)] = getattr(self, "visit_" + type(node).__name__, self.generic_visit)
         return visitor(node)
         
     def generic_visit(self, node) -> 'AST':
@@ -174,48 +203,28 @@ class NodeTransformer(NodeVisitor):
     https://docs.python.org/3/library/ast.html#ast.NodeTransformer
     """
     def generic_visit(self, node) -> 'AST':
-        for attrib, old in iter_attribs(node):
-            if isinstance(old, list):
-                new = []
-                for value in old:
-                    if isinstance(value, AST):
-                        value = self.visit(old)
-                        if value is None:
-                            continue
-                        elif isinstance(value, list):
-                            new.extend(value)
-                            continue
-                        else:
-                            new.append(value)
-                            continue
-                    new.append(value)
-                old[:] = new
-            elif isinstance(old, AST):
+        for name in node._all_names:
+            old = getattr(node, name, None)
+            if type(old) is list:
+                old[:] = self._transform_list(old)
+            elif type(old) in _ast_types:
                 new = self.visit(old)
                 if new is None:
-                    delattr(node, attrib)
+                    delattr(node, name)
                 else:
-                    setattr(node, attrib, new)
-        for field, old in iter_fields(node):
-            if isinstance(old, list):
-                new = []
-                for value in old:
-                    if isinstance(value, AST):
-                        value = self.visit(old)
-                        if value is None:
-                            continue
-                        elif isinstance(value, list):
-                            new.extend(value)
-                            continue
-                        else:
-                            new.append(value)
-                            continue
-                    new.append(value)
-                old[:] = new
-            elif isinstance(old, AST):
-                new = self.visit(old)
-                if new is None:
-                    delattr(node, field)
-                else:
-                    setattr(node, field, new)
-        return node
\ No newline at end of file
+                    setattr(node, name, new)
+        return node
+    
+    def _transform_list(self, old: list) -> list:
+        """Visit every node in `old` and return the list of their replacements."""
+        new = []
+        for value in old:
+            if type(value) in _ast_types:
+                value = self.visit(value)
+                if value is None:
+                    continue
+                elif isinstance(value, list):
+                    new.extend(value)
+                    continue
+            new.append(value)
+        return new
@@ -1,6 +1,7 @@
 # This module implements a parser for a variation of ASDL as an exercise
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 
 # Default types: ident, int (or char), string (or str), boolean (or bool), float
 #
@@ -13,53 +14,76 @@ from dataclasses import dataclass
 # fields = '(' field (',' field)* ')'
 # field = type_name ('?'|'*'|'+')? field_name
 
+# Slots already declared by AST in ast_basis.py
+_ast_slots = ("symref", "lineno", "col_offset", "end_lineno", "end_col_offset")
+
+_comment_re = re.compile(r"--[^\n]*")
+_module_re = re.compile(r"\s*module\s+(\w+)\s*\{\s*(.*)\s*\}\s*(attributes\s*)?$", re.DOTALL | re.MULTILINE)
+
+# Tokens of a module body, named by kind. Whitespace is skipped and anything else becomes an error token that no rule accepts.
+_token_re = re.compile(r"(?P<ws>\s+)|(?P<name>\w+)|(?P<lp>\()|(?P<rp>\))|(?P<comma>,)|(?P<pipe>\|)|(?P<symbol>[?*+])|(?P<eq>=)|(?P<error>.)", re.DOTALL)
+
 _default_types = {"ident": str, "int": int, "char": int, "string": str, "str": str, "boolean": bool, "bool": bool, "float": float}
 
 def ParseAsdl(asdl_string: str) -> 'Module':
-    regex_flag = re.DOTALL | re.MULTILINE
-    
     # Extract module name and inside
-    asdl_string = re.sub(r"\-\-(.*)$", "", asdl_string, flags=re.MULTILINE)
-    m = re.match(r"^\s*module\s+(\w+)\s*\{\s*(.*)\s*\}\s*(attributes\s*)?$", asdl_string, regex_flag)
+    asdl_string = _comment_re.sub("", asdl_string)
+    m = _module_re.match(asdl_string)
     if m == None: raise Exception("missing module statement")
     
     mod_name, mod_raw, has_attribs = m.group(1, 2, 3)
     
+    tokens: list[tuple[str, str, int]] = []
+    for m in _token_re.finditer(mod_raw):
+        kind = m.lastgroup
+        if kind == "ws": continue
+        tokens.append((kind, m.group(), m.start()))
+    tokens.append(("eof", "", len(mod_raw)))
+    pos = 0
+    
+    def peek(kind: str, value: str | None = None) -> bool:
+        token = tokens[pos]
+        return token[0] == kind and (value is None or token[1] == value)
+    
+    def accept(kind: str, value: str | None = None) -> str | None:
+        nonlocal pos
+        if not peek(kind, value): return None
+        pos += 1
+        return tokens[pos-1][1]
+    
     def getField() -> 'Field':
-        nonlocal mod_raw
-        if (m := re.match(r"^\s*(\w+)([\?\*\+])?\s+(\w+)\s*", mod_raw, regex_flag)) == None:
+        type_start = tokens[pos][2]
+        if (type_name := accept("name")) == None:
+            raise Exception("expected field")
+        # The symbol must directly follow the type name and be separated from the field name
+        if peek("symbol") and tokens[pos][2] != type_start + len(type_name):
+            raise Exception("expected field")
+        if (symbol := accept("symbol")) and tokens[pos][2] == tokens[pos-1][2] + 1:
+            raise Exception("expected field")
+        if (field_name := accept("name")) == None:
             raise Exception("expected field")
-        mod_raw = mod_raw[m.end():]
-        type_name, symbol, field_name = m.group(1, 2, 3)
         can_none, can_many = False, False
         if symbol and symbol in "?*": can_none = True
         if symbol and symbol in "*+": can_many = True
         return Field(type_name, field_name, can_none, can_many)
     
     def getFields() -> list['Field']:
-        nonlocal mod_raw
         fields = []
-        if (m := re.match(r"^\s*\(\s*", mod_raw, regex_flag)) == None:
+        if accept("lp") == None:
             raise Exception("expected left parenthesis to begin field list.")
-        mod_raw = mod_raw[m.end():]
         while True:
             fields.append(getField())
-            if (m := re.match(r"^\s*,\s*", mod_raw, regex_flag)) == None: break
-            mod_raw = mod_raw[m.end():]
-        if (m := re.match(r"^\s*\)\s*", mod_raw, regex_flag)) == None:
+            if accept("comma") == None: break
+        if accept("rp") == None:
             raise Exception("expected right parenthesis to close field list.")
-        mod_raw = mod_raw[m.end():]
         return fields
     
     def getConstructor() -> 'Constructor':
-        nonlocal mod_raw
-        if (m := re.match(r"^\s*(\w+)\s*", mod_raw, regex_flag)) == None:
+        if (ctor_name := accept("name")) == None:
             raise Exception("expected name in constructor")
-        mod_raw = mod_raw[m.end():]
-        ctor_name = m.group(1)
         if not ctor_name[0].isupper():
             raise Exception("constructor name must start with an uppercase later")
-        if (m := re.match(r"^\s*\(\s*", mod_raw, regex_flag)) == None:
+        if not peek("lp"):
             return Constructor(ctor_name, [])
         try:
             return Constructor(ctor_name, getFields())
@@ -67,15 +91,12 @@ def ParseAsdl(asdl_string: str) -> 'Module':
             raise Exception(f"in ctor of '{ctor_name}'") from e
     
     def getSumType() -> 'ProductType':
-        nonlocal mod_raw
         ctors = []
         while True:
             ctors.append(getConstructor())
-            if (m := re.match(r"^\s*\|\s*", mod_raw, regex_flag)) == None: break
-            mod_raw = mod_raw[m.end():]
+            if accept("pipe") == None: break
         attribs = []
-        if (m := re.match(r"^\s*attributes\s*", mod_raw, regex_flag)) != None:
-            mod_raw = mod_raw[m.end():]
+        if accept("name", "attributes") != None:
             attribs = getFields()
         return SumType(ctors, attribs)
     
@@ -83,11 +104,9 @@ def ParseAsdl(asdl_string: str) -> 'Module':
     
     defined = set()
     
-    while mod_raw.strip() != "":
-        if (m := re.match(r"^\s*(\w+)\s*=\s*", mod_raw, regex_flag)) == None:
+    while not peek("eof"):
+        if (type_name := accept("name")) == None or accept("eq") == None:
             raise Exception("expected type definition")
-        mod_raw = mod_raw[m.end():]
-        type_name = m.group(1)
         if type_name in defined:
             raise Exception(f"cannot define type '{type_name}' twice.")
         defined.add(type_name)
@@ -95,7 +114,7 @@ def ParseAsdl(asdl_string: str) -> 'Module':
             if type_name == "AST" or type_name in _default_types:
                 raise Exception(f"cannot redefine basic type.")
             
-            if (m := re.match(r"^\s*\(", mod_raw, regex_flag)) == None:
+            if not peek("lp"):
                 type = getSumType()
             else:
                 type = ProductType(getFields())
@@ -167,72 +186,71 @@ def AsdlToPy(asdl_string: str) -> str:
         ast = f.read()
     asdl = ParseAsdl(asdl_string)
     
+    @lru_cache(None)
     def GetTypeName(name: str) -> str:
         if name in _default_types:
             return _default_types[name].__name__
         return f"'{name}'"
     
-    def ToParam(field: 'Field') -> str:
-        type = GetTypeName(field.type_name)
-        if field.can_many:
+    @lru_cache(None)
+    def GetAnnotation(type_name: str, can_many: bool, can_none: bool) -> str:
+        type = GetTypeName(type_name)
+        if can_many:
             type = f"list[{type}]"
-        elif field.can_none:
+        elif can_none:
             type = f"{type} | None"
-        return f"{field.field_name}: {type}"
+        return type
     
-    def ToAssign(field: 'Field') -> str:
-        type = GetTypeName(field.type_name)
-        if field.can_many:
-            type = f"list[{type}]"
-        elif field.can_none:
-            type = f"{type} | None"
-        return f"self.{field.field_name}: {type} = {field.field_name}"
+    def ToAnnotation(field: 'Field') -> str:
+        return f"{field.field_name}: {GetAnnotation(field.type_name, field.can_many, field.can_none)}"
+    
+    def ToSlots(fields: list['Field']) -> str:
+        slots = [f'"{x.field_name}"' for x in fields if x.field_name not in _ast_slots]
+        if len(slots) == 0:
+            return "__slots__ = ()"
+        return f"__slots__ = ({', '.join(slots)},)"
+    
+    def ToChildFields(fields: list['Field']) -> str:
+        children = [f'("{x.field_name}", {x.can_many})' for x in fields if x.type_name not in _default_types]
+        if len(children) == 0:
+            return "_child_fields = ()"
+        return f"_child_fields = ({', '.join(children)},)"
     
     def GenAbstractClass(name: str, attribs: list['Field']) -> str:
         if len(attribs) == 0:
-            return f"class {name}(AST): pass"
+            return f"class {name}(AST):\n\t__slots__ = ()"
         
         names = ", ".join(map(lambda x: f'"{x.field_name}"', attribs))
-        params = ", ".join(map(ToParam, attribs))
-        assignments = "\n\t\t".join(map(ToAssign, attribs))
+        annotations = "\n\t".join(map(ToAnnotation, attribs))
         
-        return f"class {name}(AST):\n\tdef __init__(self, {params}):\n\t\tself._attribs = ({names},)\n\t\t{assignments}"
+        return f"class {name}(AST):\n\t{ToSlots(attribs)}\n\t_attribs = ({names},)\n\t_all_names = _attribs\n\t{ToChildFields(attribs)}\n\t{annotations}\n\t__init__ = _make_init((), _attribs)"
     
     def GenDataClass(name: str, fields: list['Field'], parent: str = "AST", parent_attribs: list['Field'] = []) -> str:
         if len(fields) == 0:
-            return f"class {name}({parent}): pass"
+            return f"class {name}({parent}):\n\t__slots__ = ()"
         
-        superctor = ""
-        if len(fields) > 0:
-            fields_list = "self._fields = (" + ", ".join(map(lambda x: f'"{x.field_name}"', fields)) + ",)"
-        else:
-            fields_list = ""
-        attrib_args = ", ".join(map(lambda x: f"{x.field_name}", parent_attribs))
-        attrib_params = ", ".join(map(ToParam, parent_attribs))
-        params = ", ".join(map(ToParam, fields))
+        names = ", ".join(map(lambda x: f'"{x.field_name}"', fields))
+        all_names = ", ".join(map(lambda x: f'"{x.field_name}"', parent_attribs + fields))
+        annotations = "\n\t".join(map(ToAnnotation, fields))
+        init = "_make_init(_fields)"
         if len(parent_attribs) > 0:
-            if params.strip() == "":
-                params = attrib_args
-            else:
-                params = ", ".join([attrib_params, params])
-            superctor = f"super().__init__({attrib_args})\n\t\t"
-        assignments = "".join("\n\t\t" + x for x in map(ToAssign, fields))
+            init = f"_make_init(_fields, {parent}._attribs)"
         
-        return f"class {name}({parent}):\n\tdef __init__(self, {params}):\n\t\t{superctor}{fields_list}{assignments}"
+        return f"class {name}({parent}):\n\t{ToSlots(fields)}\n\t_fields = ({names},)\n\t_all_names = ({all_names},)\n\t{ToChildFields(parent_attribs + fields)}\n\t{annotations}\n\t__init__ = {init}"
     
-    ast += f"\n\n### GENERATED CLASSES FOR {asdl.mod_name} ###"
+    parts = [ast, f"\n\n### GENERATED CLASSES FOR {asdl.mod_name} ###"]
     
     unique_types = set()
     
     for typedef in asdl.typedefs:
         if isinstance(typedef.type_def, ProductType):
-            ast += f"\n\n## TYPE '{typedef.type_name}'\n"
-            ast += GenDataClass(typedef.type_name, typedef.type_def.fields)
+            parts.append(f"\n\n## TYPE '{typedef.type_name}'\n")
+            parts.append(GenDataClass(typedef.type_name, typedef.type_def.fields))
         elif isinstance(typedef.type_def, SumType):
-            ast += f"\n\n## TYPE '{typedef.type_name}'\n"
-            ast += GenAbstractClass(typedef.type_name, typedef.type_def.attribs)
+            parts.append(f"\n\n## TYPE '{typedef.type_name}'\n")
+            parts.append(GenAbstractClass(typedef.type_name, typedef.type_def.attribs))
             for ctor in typedef.type_def.ctors:
-                ast += "\n\n"
-                ast += GenDataClass(ctor.ctor_name, ctor.fields, typedef.type_name, typedef.type_def.attribs)
+                parts.append("\n\n")
+                parts.append(GenDataClass(ctor.ctor_name, ctor.fields, typedef.type_name, typedef.type_def.attribs))
     
-    return ast
\ No newline at end of file
+    return "".join(parts)
\ No newline at end of file